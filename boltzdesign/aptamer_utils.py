@@ -5,9 +5,180 @@ This module provides specialized loss functions and optimization tools
 for designing nucleic acid aptamers with desired properties.
 """
 
+import functools
+import importlib
+import math
+
 import torch
 import numpy as np
-from typing import Optional, Tuple
+from typing import List, Optional, Sequence, Tuple, Union
+
+numba_is_installed = importlib.util.find_spec("numba") is not None
+if numba_is_installed:
+    import numba
+
+# Nucleotide indices in the token vocabulary
+# (assumes vocabulary order: A, G, C, U/T, N, DA, DG, DC, DT, DN)
+# For RNA: A=24, G=25, C=26, U=27
+# For DNA: DA=29, DG=30, DC=31, DT=32
+_RNA_G_IDX = 25
+_DNA_G_IDX = 30
+# G and C are adjacent, so both are read through a slice (a view, no index tensor)
+_RNA_GC_SLICE = slice(25, 27)
+_DNA_GC_SLICE = slice(30, 32)
+
+_VALID_NT = frozenset('ACGTU')
+
+# Six consecutive copies of the same base, in the order bases are reported
+_HOMOPOLYMER_RUNS = tuple(base * 6 for base in 'ACGU')
+
+
+def _as_upper_bytes(sequence: str) -> np.ndarray:
+    """ASCII bytes of the sequence with letters upper-cased by clearing bit 0x20.
+
+    Non-ASCII characters become '?' so the length is preserved. Only letters
+    can map onto A/C/G/T/U, so the case fold never turns an invalid
+    character into a valid one.
+    """
+    return np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8) & 0xDF
+
+
+if numba_is_installed:
+    @numba.njit(cache=True)
+    def _repeats_in_doubled(seq_bytes, period):
+        """Whether seq_bytes[:period] * (length // period + 1) occurs in seq_bytes * 2.
+
+        Same test as the str fallback, without building either string: the
+        repeated prefix occurs at p when its first bytes match the prefix and
+        every later byte equals the one period before it.
+        """
+        length = seq_bytes.shape[0]
+        if length == 0:
+            return True
+        unit = min(period, length)
+        needle = unit * (length // period + 1)
+        # Number of consecutive q >= p with doubled[q] == doubled[q + unit]
+        run = 0
+        for p in range(2 * length - unit - 1, -1, -1):
+            if seq_bytes[p % length] == seq_bytes[(p + unit) % length]:
+                run += 1
+            else:
+                run = 0
+            if p + needle <= 2 * length and run >= needle - unit:
+                matches = True
+                for j in range(unit):
+                    if seq_bytes[(p + j) % length] != seq_bytes[j]:
+                        matches = False
+                        break
+                if matches:
+                    return True
+        return False
+
+    @numba.njit(cache=True)
+    def _scan_sequence_bytes(seq_bytes):
+        """Statistics of the bytes from _as_upper_bytes; see _scan_sequence."""
+        length = seq_bytes.shape[0]
+        all_valid = True
+        gc_count = 0
+        # Homopolymer bases reported in 'ACGU' order, like the str fallback
+        homopolymer_bases = np.array([0x41, 0x43, 0x47, 0x55], dtype=np.uint8)
+        has_homopolymer = np.zeros(4, dtype=np.bool_)
+        run = 0
+        for j in range(length):
+            b = seq_bytes[j]
+            is_gc = (b == 0x47) | (b == 0x43)
+            is_atu = (b == 0x41) | (b == 0x54) | (b == 0x55)
+            all_valid &= is_gc | is_atu
+            gc_count += is_gc
+
+            # Length of the run of identical bases ending at j
+            if j > 0 and b == seq_bytes[j - 1]:
+                run += 1
+            else:
+                run = 1
+            if run == 6:
+                for k in range(4):
+                    if b == homopolymer_bases[k]:
+                        has_homopolymer[k] = True
+
+        homopolymer_base = 0
+        for k in range(4):
+            if has_homopolymer[k]:
+                homopolymer_base = homopolymer_bases[k]
+                break
+
+        repeat_period = 0
+        for period in range(2, 6):
+            if _repeats_in_doubled(seq_bytes, period):
+                repeat_period = period
+                break
+
+        return all_valid, gc_count, homopolymer_base, repeat_period
+
+    @numba.njit(parallel=True, cache=True)
+    def _scan_sequences_bytes(seq_bytes, offsets):
+        """_scan_sequence_bytes over concatenated sequences, in parallel without the GIL."""
+        num_sequences = offsets.shape[0] - 1
+        all_valid = np.empty(num_sequences, dtype=np.bool_)
+        gc_count = np.empty(num_sequences, dtype=np.int64)
+        homopolymer_base = np.empty(num_sequences, dtype=np.int64)
+        repeat_period = np.empty(num_sequences, dtype=np.int64)
+        for k in numba.prange(num_sequences):
+            all_valid[k], gc_count[k], homopolymer_base[k], repeat_period[k] = _scan_sequence_bytes(
+                seq_bytes[offsets[k]:offsets[k + 1]]
+            )
+        return all_valid, gc_count, homopolymer_base, repeat_period
+
+
+def _scan_sequence(sequence: str) -> Tuple[bool, int, str, int]:
+    """
+    Collect the sequence statistics checked by validate_aptamer_sequence.
+
+    Uses numba-compiled loops over the sequence bytes when numba is
+    installed and falls back to str methods otherwise.
+
+    Args:
+        sequence: Nucleotide sequence in any case
+
+    Returns:
+        Tuple of (all_valid, gc_count, homopolymer_base, repeat_period), where
+        homopolymer_base is '' and repeat_period is 0 when none is found
+    """
+    if numba_is_installed:
+        all_valid, gc_count, homopolymer_base, repeat_period = _scan_sequence_bytes(_as_upper_bytes(sequence))
+        return bool(all_valid), int(gc_count), chr(homopolymer_base) if homopolymer_base else '', int(repeat_period)
+
+    # str.upper() is cheaper than building the byte array the numba path needs
+    sequence = sequence.upper()
+    all_valid = _VALID_NT.issuperset(sequence)
+    gc_count = sequence.count('G') + sequence.count('C')
+    homopolymer_base = next((run[0] for run in _HOMOPOLYMER_RUNS if run in sequence), '')
+    # Simple repeat: the first 2-5 nt, repeated past the sequence length,
+    # occur in the sequence read twice around
+    length = len(sequence)
+    doubled = sequence * 2
+    repeat_period = next(
+        (period for period in range(2, 6) if sequence[:period] * (length // period + 1) in doubled), 0
+    )
+    return all_valid, gc_count, homopolymer_base, repeat_period
+
+
+def _scan_sequences(sequences: List[str]) -> List[Tuple[bool, int, str, int]]:
+    """_scan_sequence for many sequences; a single parallel numba call when available."""
+    if not numba_is_installed:
+        return [_scan_sequence(sequence) for sequence in sequences]
+
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum([len(sequence) for sequence in sequences], out=offsets[1:])
+    all_valid, gc_count, homopolymer_base, repeat_period = _scan_sequences_bytes(
+        _as_upper_bytes(''.join(sequences)), offsets
+    )
+    return [
+        (valid, gc, chr(base) if base else '', period)
+        for valid, gc, base, period in zip(
+            all_valid.tolist(), gc_count.tolist(), homopolymer_base.tolist(), repeat_period.tolist()
+        )
+    ]
 
 
 def calculate_gc_content(sequence: str) -> float:
@@ -26,6 +197,33 @@ def calculate_gc_content(sequence: str) -> float:
     return gc_count / total if total > 0 else 0.0
 
 
+def _gc_from_logits(logits: torch.Tensor, log_norm: torch.Tensor, target_gc: float) -> torch.Tensor:
+    """Unweighted GC content loss per batch element given logits and their log-partition [batch, length]."""
+    # Slicing past the vocabulary would silently drop channels, so fail like
+    # integer indexing does
+    vocab_size = logits.shape[-1]
+    if vocab_size < _DNA_GC_SLICE.stop:
+        raise IndexError(
+            f"GC content loss needs a vocabulary of at least {_DNA_GC_SLICE.stop} tokens, got {vocab_size}"
+        )
+
+    # Calculate expected GC content from probabilities
+    # This is a soft approximation that works during gradient-based optimization
+    # Only the G and C channels are needed, so work in log space instead of
+    # materializing the full softmax: log P(G or C) = logsumexp(l_G, l_C) - logsumexp(l)
+    gc_logit_rna = torch.logsumexp(logits[..., _RNA_GC_SLICE], dim=-1)  # G + C for RNA
+    gc_logit_dna = torch.logsumexp(logits[..., _DNA_GC_SLICE], dim=-1)  # DG + DC for DNA
+
+    # Use the maximum to handle both RNA and DNA
+    gc_prob = torch.exp(torch.maximum(gc_logit_rna, gc_logit_dna) - log_norm)
+
+    # Average across sequence length
+    mean_gc = gc_prob.mean(dim=-1)
+
+    # L2 loss from target GC content
+    return (mean_gc - target_gc) ** 2
+
+
 def gc_content_loss(logits: torch.Tensor, target_gc: float = 0.5, weight: float = 0.1) -> torch.Tensor:
     """
     Loss function to guide GC content towards a target value.
@@ -40,27 +238,26 @@ def gc_content_loss(logits: torch.Tensor, target_gc: float = 0.5, weight: float
     Returns:
         torch.Tensor: GC content loss value
     """
-    # Get nucleotide indices (assumes vocabulary order: A, G, C, U/T, N, DA, DG, DC, DT, DN)
-    # For RNA: A=24, G=25, C=26, U=27
-    # For DNA: DA=29, DG=30, DC=31, DT=32
+    log_norm = torch.logsumexp(logits, dim=-1)
+    return weight * _gc_from_logits(logits, log_norm, target_gc).mean()
 
-    probs = torch.softmax(logits, dim=-1)
 
-    # Calculate expected GC content from probabilities
-    # This is a soft approximation that works during gradient-based optimization
-    gc_prob_rna = probs[..., 25] + probs[..., 26]  # G + C for RNA
-    gc_prob_dna = probs[..., 30] + probs[..., 31]  # DG + DC for DNA
-
-    # Use the maximum to handle both RNA and DNA
-    gc_prob = torch.maximum(gc_prob_rna, gc_prob_dna)
-
-    # Average across sequence length
-    mean_gc = gc_prob.mean(dim=-1)
+def _complexity_from_log_probs(probs: torch.Tensor, log_probs: torch.Tensor) -> torch.Tensor:
+    """Unweighted sequence complexity loss per batch element given probabilities and log-probabilities."""
+    # Calculate entropy at each position (higher entropy = more diverse)
+    # Entropy = -sum(p * log(p))
+    # Uses log-softmax outputs rather than torch.special.entr(probs): entr's
+    # gradient is -(log(p) + 1), which turns into NaN through the softmax
+    # backward once a probability underflows to 0 for sharp logits
+    entropy = -(probs * log_probs).sum(dim=-1)
 
-    # L2 loss from target GC content
-    loss = ((mean_gc - target_gc) ** 2).mean()
+    # We want high entropy, so minimize negative entropy
+    mean_entropy = entropy.mean(dim=-1)
+    max_entropy = math.log(probs.shape[-1])  # Maximum possible entropy
 
-    return weight * loss
+    # Normalize to [0, 1] and invert (so low complexity = high loss)
+    complexity_score = mean_entropy / max_entropy
+    return 1.0 - complexity_score
 
 
 def sequence_complexity_loss(logits: torch.Tensor, weight: float = 0.2) -> torch.Tensor:
@@ -76,22 +273,43 @@ def sequence_complexity_loss(logits: torch.Tensor, weight: float = 0.2) -> torch
     Returns:
         torch.Tensor: Sequence complexity loss value
     """
-    probs = torch.softmax(logits, dim=-1)
+    # log_softmax is numerically stable, so no epsilon is needed before the log
+    log_probs = torch.log_softmax(logits, dim=-1)
+    return weight * _complexity_from_log_probs(torch.exp(log_probs), log_probs).mean()
 
-    # Calculate entropy at each position (higher entropy = more diverse)
-    # Entropy = -sum(p * log(p))
-    log_probs = torch.log(probs + 1e-10)  # Add small epsilon to avoid log(0)
-    entropy = -(probs * log_probs).sum(dim=-1)
 
-    # We want high entropy, so minimize negative entropy
-    mean_entropy = entropy.mean()
-    max_entropy = np.log(probs.shape[-1])  # Maximum possible entropy
+def _homopolymer_from_probs(probs: torch.Tensor, max_run: int) -> torch.Tensor:
+    """Unweighted homopolymer penalty per batch element given softmax probabilities.
 
-    # Normalize to [0, 1] and invert (so low complexity = high loss)
-    complexity_score = mean_entropy / max_entropy
-    loss = 1.0 - complexity_score
+    Peak memory is O(batch * length * vocab_size): each offset only forms a
+    shifted product that is reduced straight away, never an [L, L] matrix.
+    """
+    seq_len = probs.shape[1]
+
+    # Similarity between position l and l + i is the dot product of their
+    # probability vectors; high similarity means likely same nucleotide.
+    # Only the first few offsets are needed, so compute those shifted dot
+    # products directly instead of the full [L, L] similarity matrix.
+    num_offsets = min(max_run, seq_len - 1)
+    if num_offsets < 1:
+        return probs.new_zeros(probs.shape[0])
 
-    return weight * loss
+    # Probabilities lie in [0, 1], so on GPU the memory-bound shifted products
+    # can be read in bfloat16 while the reductions still accumulate in float32.
+    # Only without autograd: the backward would otherwise run in bfloat16 too.
+    sim_probs = probs
+    needs_grad = torch.is_grad_enabled() and probs.requires_grad
+    if probs.is_cuda and probs.dtype == torch.float32 and not needs_grad:
+        sim_probs = probs.to(torch.bfloat16)
+
+    sims = torch.stack([
+        (sim_probs[:, :-i] * sim_probs[:, i:]).sum(dim=-1, dtype=probs.dtype).mean(dim=-1)
+        for i in range(1, num_offsets + 1)
+    ], dim=-1)
+
+    # Stronger penalty for longer runs
+    run_weights = torch.arange(1, num_offsets + 1, device=probs.device, dtype=probs.dtype) / max_run
+    return (sims * run_weights).sum(dim=-1)
 
 
 def homopolymer_penalty(logits: torch.Tensor, max_run: int = 4, weight: float = 0.3) -> torch.Tensor:
@@ -109,23 +327,62 @@ def homopolymer_penalty(logits: torch.Tensor, max_run: int = 4, weight: float =
         torch.Tensor: Homopolymer penalty loss
     """
     probs = torch.softmax(logits, dim=-1)
+    return weight * _homopolymer_from_probs(probs, max_run).mean()
+
+
+def _hairpin_from_probs(probs: torch.Tensor) -> torch.Tensor:
+    """Unweighted hairpin structure loss per batch element given softmax probabilities."""
+    seq_len = probs.shape[1]
+
+    # Encourage complementarity between 5' and 3' ends
+    # For hairpin structure, first N bases should complement last N bases
+    stem_length = min(6, seq_len // 3)
+
+    # Get probabilities for 5' stem
+    stem_5_probs = probs[:, :stem_length, :]
+    # Get probabilities for 3' stem (reversed)
+    stem_3_probs = probs[:, -stem_length:, :].flip(dims=[1])
+
+    # Calculate complementarity score
+    # A-U/T pairs, G-C pairs
+    # This is a simplified version; actual implementation would need
+    # base-pairing matrix
+    complementarity = (stem_5_probs * stem_3_probs).sum(dim=-1)
+    comp_score = complementarity.mean(dim=-1)
 
-    # Calculate probability of consecutive same nucleotides
-    # For simplicity, we check adjacent positions
-    # More sophisticated version would check longer runs
+    # We want high complementarity, so minimize negative score
+    return -comp_score
 
-    # Compute similarity between adjacent positions
-    # High similarity means likely same nucleotide
-    similarity = torch.einsum('...li,...mi->...lm', probs, probs)
 
-    # Extract diagonal elements (adjacent positions)
-    penalty = 0.0
-    for i in range(1, min(max_run + 1, probs.shape[1])):
-        # Penalty for i consecutive same nucleotides
-        diagonal = torch.diagonal(similarity, offset=i, dim1=-2, dim2=-1)
-        penalty += diagonal.mean() * (i / max_run)  # Stronger penalty for longer runs
+def _gquadruplex_from_probs(probs: torch.Tensor) -> torch.Tensor:
+    """Unweighted G-quadruplex structure loss per batch element given softmax probabilities."""
+    # Encourage G-rich regions
+    # G-quadruplex requires at least 4 runs of 3+ guanines
+    # Integer indices are plain strided views (no gather), read by one kernel
+    g_prob = torch.maximum(probs[..., _RNA_G_IDX], probs[..., _DNA_G_IDX])
 
-    return weight * penalty
+    # Encourage high G content
+    mean_g = g_prob.mean(dim=-1)
+    return -mean_g  # Negative because we want to maximize
+
+
+# Structure type -> unweighted structure loss per batch element
+_STRUCTURE_LOSS_FNS = {
+    'hairpin': _hairpin_from_probs,
+    'g_quadruplex': _gquadruplex_from_probs,
+}
+
+
+def _structure_from_probs(probs: torch.Tensor, structure_type: str) -> torch.Tensor:
+    """Unweighted structure loss per batch element given softmax probabilities."""
+    # Look up the structure loss before any tensor work, so each one is a
+    # straight-line function that compiles without graph breaks
+    structure_loss_fn = _STRUCTURE_LOSS_FNS.get(structure_type)
+    if structure_loss_fn is None:
+        # Default: no structural preference
+        return probs.new_zeros(probs.shape[0])
+
+    return structure_loss_fn(probs)
 
 
 def aptamer_structure_loss(
@@ -150,45 +407,7 @@ def aptamer_structure_loss(
         torch.Tensor: Structure loss value
     """
     probs = torch.softmax(logits, dim=-1)
-    seq_len = probs.shape[1]
-
-    if structure_type == 'hairpin':
-        # Encourage complementarity between 5' and 3' ends
-        # For hairpin structure, first N bases should complement last N bases
-        stem_length = min(6, seq_len // 3)
-
-        # Get probabilities for 5' stem
-        stem_5_probs = probs[:, :stem_length, :]
-        # Get probabilities for 3' stem (reversed)
-        stem_3_probs = probs[:, -stem_length:, :].flip(dims=[1])
-
-        # Calculate complementarity score
-        # A-U/T pairs, G-C pairs
-        # This is a simplified version; actual implementation would need
-        # base-pairing matrix
-        complementarity = torch.einsum('...li,...li->...l', stem_5_probs, stem_3_probs)
-        comp_score = complementarity.mean()
-
-        # We want high complementarity, so minimize negative score
-        loss = -comp_score
-
-    elif structure_type == 'g_quadruplex':
-        # Encourage G-rich regions
-        # G-quadruplex requires at least 4 runs of 3+ guanines
-        g_idx_rna = 25  # G for RNA
-        g_idx_dna = 30  # DG for DNA
-
-        g_prob = torch.maximum(probs[..., g_idx_rna], probs[..., g_idx_dna])
-
-        # Encourage high G content
-        mean_g = g_prob.mean()
-        loss = -mean_g  # Negative because we want to maximize
-
-    else:
-        # Default: no structural preference
-        loss = torch.tensor(0.0, device=logits.device)
-
-    return weight * loss
+    return weight * _structure_from_probs(probs, structure_type).mean()
 
 
 def calculate_tm(sequence: str, na_conc: float = 50.0, mg_conc: float = 2.0) -> float:
@@ -204,6 +423,9 @@ def calculate_tm(sequence: str, na_conc: float = 50.0, mg_conc: float = 2.0) ->
 
     Returns:
         float: Estimated Tm in Celsius
+
+    Raises:
+        ValueError: If na_conc is not positive for a sequence of 14 nt or more
     """
     # Simplified Wallace rule for short sequences (< 14 nt)
     # Tm = 2(A+T) + 4(G+C)
@@ -219,16 +441,50 @@ def calculate_tm(sequence: str, na_conc: float = 50.0, mg_conc: float = 2.0) ->
         tm = 2 * at_count + 4 * gc_count
     else:
         # Simplified nearest-neighbor (this is approximate)
+        # math.log10 raises on a non-positive argument instead of returning -inf/nan
+        if na_conc <= 0:
+            raise ValueError(f"Sodium concentration must be positive, got {na_conc} mM")
         gc_content = calculate_gc_content(sequence)
-        tm = 81.5 + 16.6 * np.log10(na_conc / 1000.0) + 0.41 * (gc_content * 100) - 675.0 / length
+        tm = 81.5 + 16.6 * math.log10(na_conc / 1000.0) + 0.41 * (gc_content * 100) - 675.0 / length
 
     # Adjust for Mg2+ concentration (simplified)
     if mg_conc > 0:
-        tm += np.log10(mg_conc) * 2.0
+        tm += math.log10(mg_conc) * 2.0
 
     return tm
 
 
+def _validation_result(
+    sequence: str,
+    all_valid: bool,
+    gc_count: int,
+    homopolymer_base: str,
+    repeat_period: int
+) -> Tuple[bool, str]:
+    """(is_valid, message) for a sequence of valid length, given its _scan_sequence statistics."""
+    length = len(sequence)
+
+    # Check for valid nucleotides
+    if not all_valid:
+        invalid = set(sequence.upper()) - _VALID_NT
+        return False, f"Invalid nucleotides: {invalid}"
+
+    # Check GC content (should be 30-70% for most applications)
+    gc = gc_count / length if length > 0 else 0.0
+    if gc < 0.3 or gc > 0.7:
+        return False, f"Extreme GC content: {gc:.1%} (should be 30-70%)"
+
+    # Check for long homopolymers (> 5 of same base)
+    if homopolymer_base:
+        return False, f"Long homopolymer detected: {homopolymer_base * 6}"
+
+    # Check for simple repeats
+    if repeat_period:
+        return False, f"Simple repeat detected: {sequence[:repeat_period].upper()}"
+
+    return True, "Sequence passed validation"
+
+
 def validate_aptamer_sequence(sequence: str, min_length: int = 20, max_length: int = 100) -> Tuple[bool, str]:
     """
     Validate an aptamer sequence for common issues.
@@ -241,7 +497,6 @@ def validate_aptamer_sequence(sequence: str, min_length: int = 20, max_length: i
     Returns:
         Tuple of (is_valid, message)
     """
-    sequence = sequence.upper()
     length = len(sequence)
 
     # Check length
@@ -250,29 +505,109 @@ def validate_aptamer_sequence(sequence: str, min_length: int = 20, max_length: i
     if length > max_length:
         return False, f"Sequence too long ({length} > {max_length})"
 
-    # Check for valid nucleotides
-    valid_nt = set('ACGTU')
-    invalid = set(sequence) - valid_nt
-    if invalid:
-        return False, f"Invalid nucleotides: {invalid}"
+    return _validation_result(sequence, *_scan_sequence(sequence))
 
-    # Check GC content (should be 30-70% for most applications)
-    gc = calculate_gc_content(sequence)
-    if gc < 0.3 or gc > 0.7:
-        return False, f"Extreme GC content: {gc:.1%} (should be 30-70%)"
 
-    # Check for long homopolymers (> 5 of same base)
-    for nt in 'ACGU':
-        if nt * 6 in sequence:
-            return False, f"Long homopolymer detected: {nt * 6}"
+def validate_aptamer_sequence_batch(
+    sequences: List[str],
+    min_length: int = 20,
+    max_length: int = 100
+) -> List[Tuple[bool, str]]:
+    """
+    Validate many aptamer sequences; same result as validate_aptamer_sequence on each.
 
-    # Check for simple repeats
-    for i in range(2, 6):
-        repeat = sequence[:i]
-        if repeat * (length // i + 1) in sequence * 2:
-            return False, f"Simple repeat detected: {repeat}"
+    When numba is installed all sequences are scanned in one parallel call,
+    which avoids the per-sequence interpreter overhead for large candidate sets.
 
-    return True, "Sequence passed validation"
+    Args:
+        sequences: Nucleotide sequences to validate
+        min_length: Minimum acceptable length
+        max_length: Maximum acceptable length
+
+    Returns:
+        List of (is_valid, message) tuples, one per sequence
+    """
+    results = [None] * len(sequences)
+
+    # Length failures need no scan
+    in_range = []
+    for i, sequence in enumerate(sequences):
+        if min_length <= len(sequence) <= max_length:
+            in_range.append(i)
+        else:
+            results[i] = validate_aptamer_sequence(sequence, min_length, max_length)
+
+    scans = _scan_sequences([sequences[i] for i in in_range])
+    for i, scan in zip(in_range, scans):
+        results[i] = _validation_result(sequences[i], *scan)
+
+    return results
+
+
+def _aptamer_loss_terms(
+    logits: torch.Tensor,
+    target_gc: float,
+    structure_type: Optional[str]
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Unweighted (gc, complexity, homopolymer, structure) losses per batch element sharing one softmax."""
+    # Normalize the logits once and share the result across all loss terms
+    log_norm = torch.logsumexp(logits, dim=-1)
+    log_probs = logits - log_norm.unsqueeze(-1)
+    probs = torch.exp(log_probs)
+
+    gc_loss = _gc_from_logits(logits, log_norm, target_gc)
+    comp_loss = _complexity_from_log_probs(probs, log_probs)
+    homo_loss = _homopolymer_from_probs(probs, max_run=4)
+    if structure_type:
+        struct_loss = _structure_from_probs(probs, structure_type)
+    else:
+        struct_loss = logits.new_zeros(logits.shape[0])
+
+    return gc_loss, comp_loss, homo_loss, struct_loss
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_aptamer_loss_terms():
+    """torch.compile'd _aptamer_loss_terms, built on first use.
+
+    Shapes are marked dynamic since the designed sequence length changes
+    between design iterations.
+    """
+    return torch.compile(_aptamer_loss_terms, dynamic=True, fullgraph=True)
+
+
+_LOSS_NAMES = ('gc_content_loss', 'complexity_loss', 'homopolymer_loss', 'structure_loss', 'total_aptamer_loss')
+
+
+def _weighted_loss_terms(
+    logits: torch.Tensor,
+    target_gc: float,
+    structure_type: Optional[str],
+    weights: Optional[dict],
+    compile_loss: bool
+) -> torch.Tensor:
+    """Weighted loss terms and their total per batch element, stacked in _LOSS_NAMES order [5, batch]."""
+    if weights is None:
+        weights = {
+            'gc_content': 0.1,
+            'complexity': 0.2,
+            'homopolymer': 0.3,
+            'structure': 0.15
+        }
+
+    loss_terms_fn = _compiled_aptamer_loss_terms() if compile_loss else _aptamer_loss_terms
+    gc_loss, comp_loss, homo_loss, struct_loss = loss_terms_fn(logits, target_gc, structure_type)
+
+    gc_loss = weights['gc_content'] * gc_loss
+    comp_loss = weights['complexity'] * comp_loss
+    homo_loss = weights['homopolymer'] * homo_loss
+    if structure_type:
+        struct_loss = weights['structure'] * struct_loss
+
+    # Total loss
+    total_loss = gc_loss + comp_loss + homo_loss + struct_loss
+
+    return torch.stack([gc_loss, comp_loss, homo_loss, struct_loss, total_loss])
 
 
 # Combined aptamer loss function
@@ -280,7 +615,8 @@ def aptamer_design_loss(
     logits: torch.Tensor,
     target_gc: float = 0.5,
     structure_type: Optional[str] = None,
-    weights: Optional[dict] = None
+    weights: Optional[dict] = None,
+    compile_loss: bool = False
 ) -> Tuple[torch.Tensor, dict]:
     """
     Combined loss function for aptamer design.
@@ -290,42 +626,64 @@ def aptamer_design_loss(
         target_gc: Target GC content
         structure_type: Desired secondary structure (optional)
         weights: Dictionary of loss weights (optional)
+        compile_loss: Fuse the loss terms with torch.compile (first call is slow)
 
     Returns:
         Tuple of (total_loss, loss_dict)
     """
-    if weights is None:
-        weights = {
-            'gc_content': 0.1,
-            'complexity': 0.2,
-            'homopolymer': 0.3,
-            'structure': 0.15
-        }
+    loss_terms = _weighted_loss_terms(logits, target_gc, structure_type, weights, compile_loss).mean(dim=-1)
 
-    loss_dict = {}
+    # Copy all values to the host at once: every .item() is a device sync
+    loss_dict = dict(zip(_LOSS_NAMES, loss_terms.detach().cpu().tolist()))
 
-    # GC content loss
-    gc_loss = gc_content_loss(logits, target_gc, weights['gc_content'])
-    loss_dict['gc_content_loss'] = gc_loss.item()
+    return loss_terms[-1], loss_dict
 
-    # Sequence complexity loss
-    comp_loss = sequence_complexity_loss(logits, weights['complexity'])
-    loss_dict['complexity_loss'] = comp_loss.item()
 
-    # Homopolymer penalty
-    homo_loss = homopolymer_penalty(logits, weight=weights['homopolymer'])
-    loss_dict['homopolymer_loss'] = homo_loss.item()
+def aptamer_design_loss_batched(
+    logits: Union[Sequence[torch.Tensor], torch.Tensor],
+    target_gc: float = 0.5,
+    structure_type: Optional[str] = None,
+    weights: Optional[dict] = None,
+    compile_loss: bool = False
+) -> Tuple[torch.Tensor, List[dict]]:
+    """
+    Combined aptamer loss for several candidates evaluated together.
 
-    # Structure loss (optional)
-    if structure_type:
-        struct_loss = aptamer_structure_loss(logits, structure_type, weights['structure'])
-        loss_dict['structure_loss'] = struct_loss.item()
+    The candidates are concatenated along the batch dimension, so every loss
+    term is computed once for the whole set instead of once per candidate.
+    All candidates must share the same batch size, length and vocabulary.
+
+    Args:
+        logits: List of [batch, length, vocab_size] logits tensors, one per
+            candidate, or a stacked [num_candidates, batch, length, vocab_size] tensor
+        target_gc: Target GC content
+        structure_type: Desired secondary structure (optional)
+        weights: Dictionary of loss weights (optional)
+        compile_loss: Fuse the loss terms with torch.compile (first call is slow)
+
+    Returns:
+        Tuple of (total_losses [num_candidates], list of per-candidate loss_dict),
+        each matching aptamer_design_loss on that candidate alone
+    """
+    if isinstance(logits, torch.Tensor):
+        if logits.dim() != 4:
+            raise ValueError(
+                f"Stacked logits must be [num_candidates, batch, length, vocab_size], got shape {tuple(logits.shape)}"
+            )
+        num_candidates, batch_size = logits.shape[:2]
+        stacked_logits = logits.flatten(0, 1)
     else:
-        struct_loss = torch.tensor(0.0, device=logits.device)
-        loss_dict['structure_loss'] = 0.0
+        shapes = {tuple(candidate.shape) for candidate in logits}
+        if len(shapes) != 1:
+            raise ValueError(f"All candidates must have the same logits shape, got {sorted(shapes)}")
+        num_candidates, batch_size = len(logits), logits[0].shape[0]
+        stacked_logits = torch.cat(list(logits), dim=0)
 
-    # Total loss
-    total_loss = gc_loss + comp_loss + homo_loss + struct_loss
-    loss_dict['total_aptamer_loss'] = total_loss.item()
+    loss_terms = _weighted_loss_terms(stacked_logits, target_gc, structure_type, weights, compile_loss)
+    loss_terms = loss_terms.view(len(_LOSS_NAMES), num_candidates, batch_size).mean(dim=-1)
+
+    # One host transfer for all candidates
+    loss_values = loss_terms.detach().cpu().tolist()
+    loss_dicts = [dict(zip(_LOSS_NAMES, candidate_values)) for candidate_values in zip(*loss_values)]
 
-    return total_loss, loss_dict
+    return loss_terms[-1], loss_dicts